@@ -4,12 +4,18 @@
 # __init__.py
 from .printter import Printter
 from .loggerr import Loggerr
+from .cutter import Cutter
+from .cacherr import Cacherr
+from .samplerr import Samplerr
+from .shardder import Shardder
+from .executtor import Executtor, get_executtor, cross_check, benchmark
+from .resamplerr import Resamplerr
 
 
 # Define package-level variables or functions if needed
 __version__ = "0.0.1"
 __author__ = "Jakub Bartosz Bręczewski"
-__all__ = ["Printter", "Loggerr"]
+__all__ = ["Printter", "Loggerr", "Cutter", "Cacherr", "Samplerr", "Shardder", "Executtor", "get_executtor", "cross_check", "benchmark", "Resamplerr"]
 
 
 # You can also include any initialization code for your package here
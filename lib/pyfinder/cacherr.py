@@ -0,0 +1,235 @@
+# Version 0.0.1
+"""
+Cacherr class for Python scripts applications.
+Keeps the branches used by the cuts as uncompressed per-column .npy files that can be memory-mapped.
+"""
+import hashlib
+import json
+import os
+from pathlib import Path
+from shutil import rmtree
+from typing import Dict, Iterable, Tuple, Union
+
+import numpy as np
+
+from .cutter import Cutter
+from .printter import Printter
+
+
+class Cacherr(Printter):
+    """
+    Columnar cache of ROOT files. Each source file gets its own directory with a `manifest.json` and one `.npy` file
+    per column (branch or fixed-index element of an array branch). The cache of a file is dropped automatically
+    when its size or modification time changes.
+    """
+
+    MANIFEST = "manifest.json"
+
+    def __init__(self, path: Path, tree_name: str = "DecayTree", step_size: str = "100 MB", verbose: bool = False):
+        """
+        Initialize the Cacherr class object.
+        ---
+        Parameters:
+            path (Path): directory where the cache is stored
+            tree_name (str): name of the TTree to convert
+            step_size (str or int): size of the chunks read from the ROOT file during the conversion
+            verbose (bool): verbose flag
+        Returns:
+            None
+        Raises:
+            None
+        """
+        super().__init__(verbose=verbose)  # Inheriting from the Printter class
+        self.path = Path(path)
+        self.tree_name = tree_name
+        self.step_size = step_size
+
+    @staticmethod
+    def _filename(column: str) -> str:
+        """Map a column name (possibly `branch[index]`) to a file name."""
+        branch, _, index = column.partition("[")
+        return f"{branch}__{index.rstrip(']')}.npy" if index else f"{branch}.npy"
+
+    @staticmethod
+    def _fingerprint(file: Path) -> dict:
+        stat = Path(file).stat()
+        return {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+
+    def _entry_dir(self, file: Path) -> Path:
+        key = hashlib.sha1(f"{Path(file).resolve()}:{self.tree_name}".encode()).hexdigest()[:16]
+        return self.path / key
+
+    def _read_manifest(self, file: Path) -> Union[dict, None]:
+        manifest = self._entry_dir(file) / self.MANIFEST
+        if not manifest.exists():
+            return None
+        with open(manifest, "r") as f:
+            return json.load(f)
+
+    def _write_manifest(self, file: Path, manifest: dict) -> None:
+        target = self._entry_dir(file) / self.MANIFEST
+        temporary = target.with_suffix(".tmp")
+        with open(temporary, "w") as f:
+            json.dump(manifest, f, indent=2)
+        os.replace(temporary, target)
+
+    def is_valid(self, file: Path) -> bool:
+        """
+        Check if the cache of a file exists and matches the current state of the source file.
+        ---
+        Parameters:
+            file (Path): source ROOT file
+        Returns:
+            bool: True if the cache can be used
+        Raises:
+            None
+        """
+        manifest = self._read_manifest(file)
+        return manifest is not None and manifest["fingerprint"] == self._fingerprint(file)
+
+    def convert(self, files: Iterable[Path], cuts: Union[Dict[str, str], Cutter]) -> None:
+        """
+        Extract the columns used by the cuts from the ROOT files. Columns that are already cached and valid are
+        not read again.
+        ---
+        Parameters:
+            files (iterable of Path): source ROOT files
+            cuts (dict or Cutter): cuts whose columns should be cached
+        Returns:
+            None
+        Raises:
+            FileNotFoundError: A source file does not exist.
+        """
+        cutter = cuts if isinstance(cuts, Cutter) else Cutter(cuts)
+        for ifile in files:
+            ifile = Path(ifile)
+            if not ifile.exists():
+                raise FileNotFoundError(f"File not found: {ifile}")
+            if not self.is_valid(ifile):
+                self.clear(ifile)
+            manifest = self._read_manifest(ifile) or {
+                "source": str(ifile.resolve()),
+                "tree": self.tree_name,
+                "fingerprint": self._fingerprint(ifile),
+                "entries": None,
+                "columns": {},
+            }
+            missing = [icolumn for icolumn in cutter.columns if icolumn not in manifest["columns"]]
+            if not missing and manifest["entries"] is not None:
+                self.viprint("Cache up to date:", str(ifile), order=1, colors="green")
+                continue
+            self.viprint(f"Caching {len(missing)} columns of", str(ifile), order=1, colors="cyan")
+            manifest["entries"], written = self._extract(ifile, cutter, missing)
+            manifest["columns"].update(written)
+            self._write_manifest(ifile, manifest)
+
+    def _extract(self, file: Path, cutter: Cutter, columns: list) -> Tuple[int, dict]:
+        """Read the given columns chunk by chunk and stream them into memory-mapped .npy files."""
+        import uproot  # type: ignore
+
+        directory = self._entry_dir(file)
+        directory.mkdir(parents=True, exist_ok=True)
+        branches = sorted({icolumn.split("[")[0] for icolumn in columns})
+        outputs = {}
+        with uproot.open(file) as rootfile:
+            tree = rootfile[self.tree_name]
+            entries = tree.num_entries
+            start = 0
+            chunks = tree.iterate(branches, step_size=self.step_size, library="ak") if branches else ()
+            for ichunk in chunks:
+                flat = cutter.flatten(ichunk, columns)
+                stop = start + len(ichunk)
+                for icolumn in columns:
+                    if icolumn not in outputs:
+                        temporary = directory / (self._filename(icolumn) + ".tmp")
+                        outputs[icolumn] = np.lib.format.open_memmap(
+                            temporary, mode="w+", dtype=flat[icolumn].dtype, shape=(entries,)
+                        )
+                    outputs[icolumn][start:stop] = flat[icolumn]
+                start = stop
+        written = {}
+        for icolumn in columns:
+            filename = self._filename(icolumn)
+            if icolumn not in outputs:  # Empty tree, nothing was iterated
+                outputs[icolumn] = np.lib.format.open_memmap(
+                    directory / (filename + ".tmp"), mode="w+", dtype=np.float64, shape=(0,)
+                )
+            outputs.pop(icolumn).flush()
+            os.replace(directory / (filename + ".tmp"), directory / filename)
+            written[icolumn] = filename
+        return entries, written
+
+    def load(self, file: Path, cuts: Union[Dict[str, str], Cutter]) -> Dict[str, np.ndarray]:
+        """
+        Memory-map the cached columns needed by the cuts, converting the file first if needed.
+        ---
+        Parameters:
+            file (Path): source ROOT file
+            cuts (dict or Cutter): cuts whose columns should be loaded
+        Returns:
+            dict: column name -> read-only memory-mapped array
+        Raises:
+            FileNotFoundError: The source file does not exist.
+        """
+        cutter = cuts if isinstance(cuts, Cutter) else Cutter(cuts)
+        self.convert([file], cutter)
+        manifest = self._read_manifest(file)
+        directory = self._entry_dir(file)
+        return {
+            icolumn: np.load(directory / manifest["columns"][icolumn], mmap_mode="r") for icolumn in cutter.columns
+        }
+
+    def entries(self, file: Path) -> int:
+        """
+        Number of entries of a cached file.
+        ---
+        Parameters:
+            file (Path): source ROOT file
+        Returns:
+            int: number of entries stored in the manifest
+        Raises:
+            KeyError: The file is not cached.
+        """
+        manifest = self._read_manifest(file)
+        if manifest is None or manifest["entries"] is None:
+            raise KeyError(f"File not cached: {file}")
+        return manifest["entries"]
+
+    def count(self, files: Iterable[Path], cuts: Union[Dict[str, str], Cutter]) -> Tuple[int, int]:
+        """
+        Count events before and after the cuts using only the cached columns.
+        ---
+        Parameters:
+            files (iterable of Path): source ROOT files (e.g. `filesFor[decay][year]`)
+            cuts (dict or Cutter): cuts to apply
+        Returns:
+            tuple: (number of events, number of events passing the cuts)
+        Raises:
+            FileNotFoundError: A source file does not exist.
+        """
+        cutter = cuts if isinstance(cuts, Cutter) else Cutter(cuts)
+        before, after = 0, 0
+        for ifile in files:
+            columns = self.load(ifile, cutter)
+            entries = self.entries(ifile)
+            before += entries
+            after += int(np.count_nonzero(cutter.evaluate(columns, size=entries)))
+        return before, after
+
+    def clear(self, file: Union[Path, None] = None) -> None:
+        """
+        Remove the cache of a single file or the whole cache directory.
+        ---
+        Parameters:
+            file (Path, optional): source ROOT file, whole cache if None
+        Returns:
+            None
+        Raises:
+            None
+        """
+        target = self.path if file is None else self._entry_dir(file)
+        if target.exists():
+            try:
+                rmtree(target)
+            except Exception as e:
+                self.vprint(f"Error while clearing cache: {e}")
@@ -0,0 +1,302 @@
+# Version 0.0.1
+"""
+Cutter class for Python scripts applications.
+Compiles RDataFrame-style cut strings into vectorised NumPy expressions.
+"""
+import ast
+import re
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+
+class Cutter:
+    """
+    Compile a dictionary of RDataFrame cut strings (e.g. `kinematic_cuts["Bs2DsPi/MC"]`) so they can be evaluated
+    on columnar NumPy arrays. Column names are the branch names used in the cuts; fixed-index array branches such as
+    `lab0_LifetimeFit_Dplus_ctau[0]` become their own column named exactly like in the cut string.
+    """
+
+    _FUNCTIONS = {
+        "abs": "abs",
+        "fabs": "abs",
+        "sqrt": "sqrt",
+        "exp": "exp",
+        "log": "log",
+        "log10": "log10",
+        "pow": "power",
+        "min": "minimum",
+        "max": "maximum",
+    }
+
+    def __init__(self, cuts: Dict[str, str]) -> None:
+        """
+        Initialize the Cutter class object.
+        ---
+        Parameters:
+            cuts (dict): cut names and RDataFrame cut expressions
+        Returns:
+            None
+        Raises:
+            ValueError: A cut expression uses syntax that can not be translated.
+        """
+        self.cuts = dict(cuts)
+        self.columns: List[str] = []
+        self._compiled = {}
+        for iname, iexpr in self.cuts.items():
+            self._compiled[iname] = self._compile(iname, iexpr)
+
+    @property
+    def expression(self) -> str:
+        """All cuts joined in a single RDataFrame filter string (same as `RCut`)."""
+        return " && ".join(icut for icut in self.cuts.values())
+
+    @property
+    def branches(self) -> List[str]:
+        """Names of the TTree branches needed to evaluate the cuts."""
+        return sorted({icolumn.split("[")[0] for icolumn in self.columns})
+
+    @staticmethod
+    def _translate(expr: str) -> str:
+        """
+        Translate C++ boolean operators to the Python ones. `!` becomes `~`, which (unlike `not`) binds tighter than
+        the comparisons, as in C++; it is turned into `logical_not` by the transformer.
+        """
+        expr = expr.replace("&&", " and ").replace("||", " or ")
+        expr = re.sub(r"!(?!=)", " ~", expr)
+        expr = re.sub(r"\btrue\b", "True", expr)
+        expr = re.sub(r"\bfalse\b", "False", expr)
+        return expr
+
+    def _compile(self, name: str, expr: str):
+        """Parse a single cut and compile it into a code object working on the `_c` columns mapping."""
+        if "~" in expr:
+            raise ValueError(f"Bitwise not is not supported in cut {name}: {expr}")
+        try:
+            tree = ast.parse(self._translate(expr).strip(), mode="eval")
+        except SyntaxError as e:
+            raise ValueError(f"Can not parse cut {name}: {expr}") from e
+        tree = ast.fix_missing_locations(_NumpyTransformer(self, name, expr).visit(tree))
+        return compile(tree, f"<cut {name}>", "eval")
+
+    def _register(self, column: str) -> None:
+        if column not in self.columns:
+            self.columns.append(column)
+
+    @staticmethod
+    def _size(columns: Dict[str, np.ndarray], size: Optional[int]) -> int:
+        if size is not None:
+            return size
+        return len(next(iter(columns.values()))) if columns else 0
+
+    def evaluate(self, columns: Dict[str, np.ndarray], name: Optional[str] = None, size: Optional[int] = None):
+        """
+        Evaluate one cut (or all of them combined) on columnar data.
+        ---
+        Parameters:
+            columns (dict): column name -> 1D array, all of the same length
+            name (str, optional): name of the cut to evaluate, all cuts combined if None
+            size (int, optional): number of events, needed only if the cuts use no columns
+        Returns:
+            np.ndarray: boolean mask of events passing the cut(s)
+        Raises:
+            KeyError: A needed column is missing.
+        """
+        size = self._size(columns, size)
+        names = self.cuts.keys() if name is None else (name,)
+        mask = np.ones(size, dtype=bool)
+        for iname in names:
+            result = eval(self._compiled[iname], {"_np": np, "_divide": _divide, "__builtins__": {}}, {"_c": columns})
+            mask &= np.broadcast_to(np.asarray(result, dtype=bool), (size,))
+        return mask
+
+    def cutflow(self, columns: Dict[str, np.ndarray], size: Optional[int] = None) -> Dict[str, int]:
+        """
+        Count events surviving each cut applied sequentially in the dictionary order.
+        ---
+        Parameters:
+            columns (dict): column name -> 1D array
+            size (int, optional): number of events, needed only if the cuts use no columns
+        Returns:
+            dict: cut name -> number of events passing this and all previous cuts
+        Raises:
+            KeyError: A needed column is missing.
+        """
+        size = self._size(columns, size)
+        mask = np.ones(size, dtype=bool)
+        flow = {}
+        for iname in self.cuts.keys():
+            mask &= self.evaluate(columns, iname, size)
+            flow[iname] = int(np.count_nonzero(mask))
+        return flow
+
+    def arrays(self, tree, entry_start: Optional[int] = None, entry_stop: Optional[int] = None, **kwargs) -> dict:
+        """
+        Read the needed columns from an uproot TTree in the [entry_start, entry_stop) range.
+        ---
+        Parameters:
+            tree (uproot.TTree): tree to read from
+            entry_start (int, optional): first entry to read
+            entry_stop (int, optional): entry after the last one to read
+            kwargs: passed to `uproot.TTree.arrays` (e.g. executors)
+        Returns:
+            dict: column name -> 1D NumPy array
+        Raises:
+            None
+        """
+        return self.flatten(tree.arrays(self.branches, entry_start=entry_start, entry_stop=entry_stop, **kwargs))
+
+    def flatten(self, arrays, columns: Optional[List[str]] = None) -> dict:
+        """
+        Turn an awkward record array of branches into flat NumPy columns. Out of range indices give NaN so that any
+        comparison on them fails.
+        ---
+        Parameters:
+            arrays (ak.Array): record array with the fields from `branches`
+            columns (list, optional): subset of `columns` to extract, all if None
+        Returns:
+            dict: column name -> 1D NumPy array
+        Raises:
+            None
+        """
+        import awkward as ak  # type: ignore
+
+        flat = {}
+        for icolumn in self.columns if columns is None else columns:
+            branch, _, index = icolumn.partition("[")
+            if not index:
+                flat[icolumn] = ak.to_numpy(arrays[branch])
+                continue
+            index = int(index.rstrip("]"))
+            values = arrays[branch]
+            if values.ndim > 1 and isinstance(values.type.content, ak.types.RegularType):
+                flat[icolumn] = ak.to_numpy(values[:, index])
+            else:
+                padded = ak.pad_none(values, index + 1, axis=1)[:, index]
+                flat[icolumn] = ak.to_numpy(ak.fill_none(padded, np.nan)).astype(np.float64)
+        return flat
+
+
+def iter_samples(filesFor: dict, decays: dict, kinematic_cuts: dict) -> Iterator[Tuple[str, int, list, Dict[str, str]]]:
+    """
+    Loop over the (decay, year) samples of the analysis the same way the notebook does. Decays without any file
+    are skipped, so their cuts (which may not be defined in `kinematic_cuts`) are never looked up.
+    ---
+    Parameters:
+        filesFor (dict): decay tag -> year -> list of files
+        decays (dict): decay tag -> decay name (key of `kinematic_cuts`)
+        kinematic_cuts (dict): decay name -> cuts
+    Returns:
+        iterator: (decay tag, year, files, cuts) for every sample
+    Raises:
+        KeyError: A decay with files has no cuts.
+    """
+    for idecay, iyears in filesFor.items():
+        if iyears == {}:
+            continue
+        for jyear, jfiles in iyears.items():
+            yield idecay, jyear, jfiles, kinematic_cuts[decays[idecay]]
+
+
+def _divide(numerator, denominator):
+    """Division with the C++ semantics: integer operands give the quotient truncated towards zero."""
+    numerator, denominator = np.asarray(numerator), np.asarray(denominator)
+    if numerator.dtype.kind in "biu" and denominator.dtype.kind in "biu":
+        quotient = np.floor_divide(numerator, denominator)
+        return quotient + ((quotient < 0) & (quotient * denominator != numerator))
+    return np.true_divide(numerator, denominator)
+
+
+class _NumpyTransformer(ast.NodeTransformer):
+    """Rewrite a parsed cut so that it reads columns from `_c` and combines them with NumPy ufuncs."""
+
+    def __init__(self, cutter: Cutter, name: str, expr: str) -> None:
+        self.cutter = cutter
+        self.name = name
+        self.expr = expr
+
+    def _fail(self, node, reason: str = "Unsupported syntax"):
+        raise ValueError(f"{reason} {ast.dump(node)} in cut {self.name}: {self.expr}")
+
+    def _column(self, column: str) -> ast.AST:
+        self.cutter._register(column)
+        return ast.Subscript(
+            value=ast.Name(id="_c", ctx=ast.Load()), slice=ast.Constant(value=column), ctx=ast.Load()
+        )
+
+    def _ufunc(self, func: str, *args) -> ast.AST:
+        attr = ast.Attribute(value=ast.Name(id="_np", ctx=ast.Load()), attr=func, ctx=ast.Load())
+        return ast.Call(func=attr, args=list(args), keywords=[])
+
+    def _reduce(self, func: str, values: list) -> ast.AST:
+        result = values[0]
+        for ivalue in values[1:]:
+            result = self._ufunc(func, result, ivalue)
+        return result
+
+    def visit_Expression(self, node):
+        node.body = self.visit(node.body)
+        return node
+
+    def visit_Name(self, node):
+        return self._column(node.id)
+
+    def visit_Subscript(self, node):
+        if not isinstance(node.value, ast.Name):
+            self._fail(node)
+        index = node.slice
+        if not isinstance(index, ast.Constant) or not isinstance(index.value, int):
+            self._fail(node)
+        return self._column(f"{node.value.id}[{index.value}]")
+
+    def visit_Constant(self, node):
+        if not isinstance(node.value, (int, float, bool)):
+            self._fail(node)
+        # C++ float literals are doubles: a float branch is promoted to double, not the literal rounded to float
+        if isinstance(node.value, float):
+            return self._ufunc("float64", node)
+        return node
+
+    def visit_BoolOp(self, node):
+        func = "logical_and" if isinstance(node.op, ast.And) else "logical_or"
+        return self._reduce(func, [self.visit(ivalue) for ivalue in node.values])
+
+    def visit_UnaryOp(self, node):
+        operand = self.visit(node.operand)
+        if isinstance(node.op, (ast.Not, ast.Invert)):
+            return self._ufunc("logical_not", operand)
+        node.operand = operand
+        return node
+
+    def visit_BinOp(self, node):
+        # Bitwise operators bind tighter than comparisons in Python but looser in C++
+        if isinstance(node.op, (ast.BitAnd, ast.BitOr, ast.BitXor, ast.LShift, ast.RShift)):
+            self._fail(node, "Bitwise operator")
+        left, right = self.visit(node.left), self.visit(node.right)
+        # C++ `/` truncates integer operands and `%` takes the sign of the dividend
+        if isinstance(node.op, ast.Div):
+            return ast.Call(func=ast.Name(id="_divide", ctx=ast.Load()), args=[left, right], keywords=[])
+        if isinstance(node.op, ast.Mod):
+            return self._ufunc("fmod", left, right)
+        node.left, node.right = left, right
+        return node
+
+    def visit_Compare(self, node):
+        # In C++ `a < b < c` means `(a < b) < c` and `!a == b` means `(!a) == b`: reject both as ambiguous
+        if len(node.ops) > 1:
+            self._fail(node, "Chained comparison")
+        if isinstance(node.ops[0], (ast.In, ast.NotIn, ast.Is, ast.IsNot)):
+            self._fail(node)
+        for ioperand in (node.left, node.comparators[0]):
+            if isinstance(ioperand, ast.UnaryOp) and isinstance(ioperand.op, ast.Invert):
+                self._fail(node, "Negated comparison operand")
+        node.left, node.comparators = self.visit(node.left), [self.visit(node.comparators[0])]
+        return node
+
+    def visit_Call(self, node):
+        if not isinstance(node.func, ast.Name) or node.func.id not in Cutter._FUNCTIONS or node.keywords:
+            self._fail(node)
+        return self._ufunc(Cutter._FUNCTIONS[node.func.id], *[self.visit(iarg) for iarg in node.args])
+
+    def generic_visit(self, node):
+        self._fail(node)
@@ -0,0 +1,402 @@
+# Version 0.0.1
+"""
+Daemonner class for Python scripts applications.
+Long-lived local analysis server keeping the backend, the decompressed columns and the compiled cuts warm.
+Start it with `python -m lib.pyfinder.daemonner` and talk to it with `DaemonClient` or through `Sessionner`.
+"""
+import argparse
+import json
+import os
+import socket
+import socketserver
+import threading
+import time
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from .cutter import iter_samples
+from .executtor import get_executtor
+from .printter import Printter
+
+
+def _default_socket() -> Path:
+    """Socket in the per-user runtime directory, or in a private directory of the user cache if there is none."""
+    runtime = os.environ.get("XDG_RUNTIME_DIR")
+    if runtime and Path(runtime).is_dir():
+        return Path(runtime) / "pyfinder.sock"
+    return Path.home() / ".cache" / "pyfinder" / "pyfinder.sock"
+
+
+DEFAULT_SOCKET = _default_socket()
+
+
+def _intkeys(obj):
+    """Turn the year keys back into integers after a JSON round trip."""
+    if isinstance(obj, dict):
+        return {
+            int(ikey) if isinstance(ikey, str) and ikey.isdigit() else ikey: _intkeys(ivalue)
+            for ikey, ivalue in obj.items()
+        }
+    if isinstance(obj, list):
+        return [_intkeys(ivalue) for ivalue in obj]
+    return obj
+
+
+class _Handler(socketserver.StreamRequestHandler):
+    """One JSON request per line, one JSON response per line."""
+
+    def handle(self):
+        for iline in self.rfile:
+            if not iline.strip():
+                continue
+            try:
+                request = json.loads(iline)
+                response = {"ok": True, "result": self.server.daemonner.dispatch(request)}
+            except Exception as e:
+                response = {"ok": False, "error": f"{type(e).__name__}: {e}"}
+            self.wfile.write((json.dumps(response) + "\n").encode())
+            self.wfile.flush()
+
+
+class _Server(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+
+class Daemonner(Printter):
+    """
+    Analysis server on a Unix socket. The backend (and with it ROOT or uproot) is created once and keeps the compiled
+    cuts; with the default cache backend the decompressed columns stay on disk and in the page cache, so a new cut on
+    a known sample is fast too. Finished results are remembered until the input files change (the most recent
+    `max_results` of them).
+    """
+
+    def __init__(
+        self,
+        socket_path: Path = DEFAULT_SOCKET,
+        backend: str = "cache",
+        tree_name: str = "DecayTree",
+        options: Optional[dict] = None,
+        max_results: int = 1024,
+        verbose: bool = False,
+    ) -> None:
+        """
+        Initialize the Daemonner class object.
+        ---
+        Parameters:
+            socket_path (Path): path of the Unix socket to listen on
+            backend (str): name of the execution backend (see `EXECUTTORS`)
+            tree_name (str): name of the TTree to read
+            options (dict, optional): extra arguments of the backend constructor
+            max_results (int): number of remembered results, the least recently used are forgotten first
+            verbose (bool): verbose flag
+        Returns:
+            None
+        Raises:
+            ValueError: Unknown backend name.
+        """
+        super().__init__(verbose=verbose)  # Inheriting from the Printter class
+        options = dict(options or {})
+        if backend == "uproot":
+            options.setdefault("keep_open", True)
+        self.socket_path = Path(socket_path)
+        self.backend = backend
+        self.executtor = get_executtor(backend, tree_name=tree_name, **options)
+        self.results = {}
+        self.max_results = max_results
+        self.started = time.time()
+        self.requests = 0
+        self._lock = threading.Lock()
+        self._requests_lock = threading.Lock()
+        self._server = None
+
+        if backend == "rdataframe":
+            import ROOT  # type: ignore  # noqa: F401 (loaded once for the whole daemon lifetime)
+
+    @staticmethod
+    def _fingerprints(files: List[str]) -> list:
+        fingerprints = []
+        for ifile in files:
+            stat = Path(ifile).stat()
+            fingerprints.append([str(Path(ifile).resolve()), stat.st_size, stat.st_mtime_ns])
+        return fingerprints
+
+    def _memo(self, key: list, compute):
+        key = json.dumps(key)
+        result = self.results.pop(key) if key in self.results else compute()
+        self.results[key] = result  # Most recently used last
+        while len(self.results) > self.max_results:
+            del self.results[next(iter(self.results))]
+        return result
+
+    def count(self, files: List[str], cuts: Dict[str, str]) -> dict:
+        """
+        Count one sample.
+        ---
+        Parameters:
+            files (list of str): ROOT files of the sample
+            cuts (dict): cut name -> RDataFrame cut expression
+        Returns:
+            dict: "N", "NCuted", "ε" and "cutflow"
+        Raises:
+            FileNotFoundError: A file does not exist.
+        """
+
+        def compute():
+            counts = self.executtor.sample([Path(ifile) for ifile in files], self.executtor.cutter(cuts))
+            counts["ε"] = counts["NCuted"] / counts["N"] if counts["N"] else 0.0
+            return counts
+
+        return self._memo(["count", self._fingerprints(files), cuts], compute)
+
+    def run(self, filesFor: dict, decays: dict, kinematic_cuts: dict) -> dict:
+        """
+        Count all (decay, year) samples, reusing the results of the samples that are already known.
+        ---
+        Parameters:
+            filesFor (dict): decay tag -> year -> list of files
+            decays (dict): decay tag -> decay name (key of `kinematic_cuts`)
+            kinematic_cuts (dict): decay name -> cuts
+        Returns:
+            dict: "NFor", "NCutedFor", "εFor" and "cutflowFor" keyed by year and decay tag
+        Raises:
+            FileNotFoundError: A file does not exist.
+        """
+        results = {"NFor": {}, "NCutedFor": {}, "εFor": {}, "cutflowFor": {}}
+        for idecay, jyear, jfiles, jcuts in iter_samples(filesFor, decays, kinematic_cuts):
+            counts = self.count(jfiles, jcuts)
+            for ikey, jkey in (("NFor", "N"), ("NCutedFor", "NCuted"), ("εFor", "ε"), ("cutflowFor", "cutflow")):
+                results[ikey].setdefault(jyear, {})[idecay] = counts[jkey]
+        return results
+
+    def status(self) -> dict:
+        """Backend, uptime, number of requests served and of remembered results."""
+        return {
+            "backend": self.backend,
+            "pid": os.getpid(),
+            "uptime": time.time() - self.started,
+            "requests": self.requests,
+            "results": len(self.results),
+            "cuts": len(self.executtor.cutters),
+        }
+
+    def invalidate(self) -> None:
+        """Forget the remembered results and close the kept files."""
+        self.results = {}
+        self.executtor.close()
+
+    def dispatch(self, request: dict):
+        """
+        Execute a client request.
+        ---
+        Parameters:
+            request (dict): "command" and its arguments
+        Returns:
+            any: JSON-serialisable result of the command
+        Raises:
+            ValueError: Unknown command.
+        """
+        command = request.get("command")
+        with self._requests_lock:
+            self.requests += 1
+        match command:
+            case "status":
+                return self.status()
+            case "shutdown":
+                threading.Thread(target=self._server.shutdown, daemon=True).start()
+                return None
+
+        # The backend and the remembered results are shared, so the work is done one request at a time
+        with self._lock:
+            match command:
+                case "count":
+                    return self.count(request["files"], request["cuts"])
+                case "run":
+                    return self.run(request["filesFor"], request["decays"], request["kinematic_cuts"])
+                case "invalidate":
+                    return self.invalidate()
+                case _:
+                    raise ValueError(f"Unknown command: {command}")
+
+    def serve(self) -> None:
+        """
+        Listen on the socket until a "shutdown" request or a KeyboardInterrupt.
+        ---
+        Parameters:
+            None
+        Returns:
+            None
+        Raises:
+            FileExistsError: Another daemon is already listening on the socket.
+        """
+        if self.socket_path.exists():
+            try:
+                DaemonClient(self.socket_path).status()
+            except (ConnectionError, OSError):
+                self.socket_path.unlink()  # Left over by a daemon that did not exit cleanly
+            else:
+                raise FileExistsError(f"Daemon already running on {self.socket_path}")
+
+        self.socket_path.parent.mkdir(mode=0o700, parents=True, exist_ok=True)
+        self._server = _Server(str(self.socket_path), _Handler)
+        os.chmod(self.socket_path, 0o600)  # Only the owner may connect
+        self._server.daemonner = self
+        self.iprint(f"Daemon ({self.backend}) listening on {self.socket_path}", order=0, colors="green")
+        try:
+            self._server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self._server.server_close()
+            self.executtor.close()
+            if self.socket_path.exists():
+                self.socket_path.unlink()
+            self.iprint("Daemon stopped", order=0, colors="dark_grey")
+
+
+class DaemonClient:
+    """Client of a running `Daemonner`."""
+
+    def __init__(self, socket_path: Path = DEFAULT_SOCKET, timeout: Optional[float] = None) -> None:
+        """
+        Initialize the DaemonClient class object.
+        ---
+        Parameters:
+            socket_path (Path): path of the daemon socket
+            timeout (float, optional): socket timeout in seconds, no timeout if None
+        Returns:
+            None
+        Raises:
+            None
+        """
+        self.socket_path = Path(socket_path)
+        self.timeout = timeout
+
+    def request(self, command: str, **kwargs):
+        """
+        Send a request and wait for the answer.
+        ---
+        Parameters:
+            command (str): "count", "run", "status", "invalidate" or "shutdown"
+            kwargs: arguments of the command
+        Returns:
+            any: result of the command, with integer year keys
+        Raises:
+            ConnectionError: The daemon is not running.
+            RuntimeError: The daemon failed to execute the request.
+        """
+        payload = {"command": command} | kwargs
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as connection:
+            connection.settimeout(self.timeout)
+            try:
+                connection.connect(str(self.socket_path))
+            except (FileNotFoundError, ConnectionRefusedError) as e:
+                raise ConnectionError(f"No daemon listening on {self.socket_path}") from e
+            connection.sendall((json.dumps(payload, default=str) + "\n").encode())
+            with connection.makefile("r") as stream:
+                response = json.loads(stream.readline())
+        if not response["ok"]:
+            raise RuntimeError(response["error"])
+        return _intkeys(response["result"])
+
+    def count(self, files: List[Path], cuts: Dict[str, str]) -> dict:
+        """Count one sample (see `Daemonner.count`). Paths are resolved here, not in the daemon working directory."""
+        return self.request("count", files=[str(Path(ifile).resolve()) for ifile in files], cuts=cuts)
+
+    def run(self, filesFor: dict, decays: dict, kinematic_cuts: dict) -> dict:
+        """Count all (decay, year) samples (see `Daemonner.run`). Paths are resolved like in `count`."""
+        filesFor = {
+            idecay: {jyear: [str(Path(kfile).resolve()) for kfile in jfiles] for jyear, jfiles in iyears.items()}
+            for idecay, iyears in filesFor.items()
+        }
+        return self.request("run", filesFor=filesFor, decays=decays, kinematic_cuts=kinematic_cuts)
+
+    def status(self) -> dict:
+        """State of the daemon."""
+        return self.request("status")
+
+    def invalidate(self) -> None:
+        """Make the daemon forget its results and close its files."""
+        return self.request("invalidate")
+
+    def shutdown(self) -> None:
+        """Stop the daemon."""
+        return self.request("shutdown")
+
+
+class DaemonAPI:
+    """
+    API object for `Sessionner`, giving a terminal session on top of a running daemon for a fixed analysis
+    (`filesFor`, `decays`, `kinematic_cuts`).
+    """
+
+    def __init__(self, filesFor: dict, decays: dict, kinematic_cuts: dict, socket_path: Path = DEFAULT_SOCKET):
+        """
+        Initialize the DaemonAPI class object.
+        ---
+        Parameters:
+            filesFor (dict): decay tag -> year -> list of files
+            decays (dict): decay tag -> decay name (key of `kinematic_cuts`)
+            kinematic_cuts (dict): decay name -> cuts
+            socket_path (Path): path of the daemon socket
+        Returns:
+            None
+        Raises:
+            None
+        """
+        self.client = DaemonClient(socket_path)
+        self.filesFor = filesFor
+        self.decays = decays
+        self.kinematic_cuts = kinematic_cuts
+        self.printter = Printter()
+        self.allowed_globals = {}
+        self.allowed_locals = {
+            "status": self.status,
+            "count": self.count,
+            "run": self.run,
+            "invalidate": self.client.invalidate,
+            "shutdown": self.client.shutdown,
+        }
+        self.allowed_locals_desc = {
+            "status": "show the daemon state",
+            "count": "count one sample, e.g. count Normalization 2016",
+            "run": "count all the samples",
+            "invalidate": "forget the results kept by the daemon",
+            "shutdown": "stop the daemon",
+        }
+        self.welcome = f"Connected to the analysis daemon on {self.client.socket_path}"
+        self.prompter = ">>>"
+        self.session_type = None
+
+    def init_session(self, session_type: str) -> None:
+        self.session_type = session_type
+
+    def status(self) -> None:
+        for ikey, ivalue in self.client.status().items():
+            self.printter.iprint(f"{ikey}: {ivalue}", order=1, colors="cyan")
+
+    def count(self, decay: str, year: str) -> None:
+        start = time.perf_counter()
+        counts = self.client.count(self.filesFor[decay][int(year)], self.kinematic_cuts[self.decays[decay]])
+        self.printter.iprint(f"{decay} ({year}) in {time.perf_counter() - start:.3f} s", order=1, colors="green")
+        self.printter.iprint(f"Before Cut Count: {counts['N']}", order=2, colors="cyan")
+        self.printter.iprint(f"After Cut Count: {counts['NCuted']}", order=2, colors="cyan")
+        self.printter.iprint(f"Efficiency: {counts['ε']:.4f}", order=2, colors="cyan")
+
+    def run(self) -> None:
+        results = self.client.run(self.filesFor, self.decays, self.kinematic_cuts)
+        for iyear, idecays in results["NFor"].items():
+            for jdecay, nfor in idecays.items():
+                ncuted = results["NCutedFor"][iyear][jdecay]
+                self.printter.iprint(f"{jdecay} ({iyear}): {nfor} -> {ncuted}", order=1, colors="cyan")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Warm analysis daemon")
+    parser.add_argument("--socket", type=Path, default=DEFAULT_SOCKET, help="path of the Unix socket")
+    parser.add_argument("--backend", default="cache", help="execution backend (rdataframe, uproot, cache)")
+    parser.add_argument("--tree", default="DecayTree", help="name of the TTree")
+    parser.add_argument("--cache-dir", type=Path, default=None, help="cache directory of the cache backend")
+    arguments = parser.parse_args()
+
+    backend_options = {"cache_dir": arguments.cache_dir} if arguments.cache_dir else {}
+    Daemonner(arguments.socket, arguments.backend, arguments.tree, backend_options, verbose=True).serve()
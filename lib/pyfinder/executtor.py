@@ -0,0 +1,375 @@
+# Version 0.0.1
+"""
+Executtor classes for Python scripts applications.
+One analysis API (counts, cutflows, efficiencies) with interchangeable execution backends.
+"""
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Iterable, List, Optional, Tuple
+
+from .cacherr import Cacherr
+from .cutter import Cutter, iter_samples
+from .printter import Printter
+
+
+class Executtor(Printter):
+    """
+    Base class of the execution backends. Subclasses implement `sample`, which counts a single list of files;
+    `run` loops over the `filesFor` structure the same way the notebook does.
+    """
+
+    name = ""
+
+    def __init__(self, tree_name: str = "DecayTree", threads: Optional[int] = None, verbose: bool = False) -> None:
+        """
+        Initialize the Executtor class object.
+        ---
+        Parameters:
+            tree_name (str): name of the TTree to read
+            threads (int, optional): number of threads, backend default if None
+            verbose (bool): verbose flag
+        Returns:
+            None
+        Raises:
+            None
+        """
+        super().__init__(verbose=verbose)  # Inheriting from the Printter class
+        self.tree_name = tree_name
+        self.threads = threads
+        self.cutters = {}
+
+    def cutter(self, cuts: dict) -> Cutter:
+        """Compiled cuts, reused for identical cut dictionaries."""
+        key = json.dumps(cuts)
+        if key not in self.cutters:
+            self.cutters[key] = Cutter(cuts)
+        return self.cutters[key]
+
+    def close(self) -> None:
+        """Release the resources kept by the backend (e.g. open files)."""
+        pass
+
+    def sample(self, files: List[Path], cutter: Cutter) -> dict:
+        """
+        Count the events of one sample.
+        ---
+        Parameters:
+            files (list of Path): ROOT files of the sample
+            cutter (Cutter): cuts to apply
+        Returns:
+            dict: "N" (events), "NCuted" (events passing all cuts) and "cutflow" (cut name -> events)
+        Raises:
+            NotImplementedError: Always, to be implemented by the backends.
+        """
+        raise NotImplementedError(f"{type(self).__name__} does not implement sample().")
+
+    def run(self, filesFor: dict, decays: dict, kinematic_cuts: dict) -> dict:
+        """
+        Count all (decay, year) samples.
+        ---
+        Parameters:
+            filesFor (dict): decay tag -> year -> list of files
+            decays (dict): decay tag -> decay name (key of `kinematic_cuts`)
+            kinematic_cuts (dict): decay name -> cuts
+        Returns:
+            dict: "NFor", "NCutedFor", "εFor" and "cutflowFor" keyed by year and decay tag
+        Raises:
+            None
+        """
+        results = {"NFor": {}, "NCutedFor": {}, "εFor": {}, "cutflowFor": {}}
+        for idecay, jyear, jfiles, jcuts in iter_samples(filesFor, decays, kinematic_cuts):
+            counts = self.sample([Path(kfile) for kfile in jfiles], self.cutter(jcuts))
+            results["NFor"].setdefault(jyear, {})[idecay] = counts["N"]
+            results["NCutedFor"].setdefault(jyear, {})[idecay] = counts["NCuted"]
+            results["εFor"].setdefault(jyear, {})[idecay] = counts["NCuted"] / counts["N"] if counts["N"] else 0.0
+            results["cutflowFor"].setdefault(jyear, {})[idecay] = counts["cutflow"]
+            self.viprint(f"{idecay} ({jyear}): {counts['N']} -> {counts['NCuted']}", order=1, colors="cyan")
+        return results
+
+
+class RDataFrameExecuttor(Executtor):
+    """Backend using `ROOT.RDataFrame`; `threads` is passed to `EnableImplicitMT` (1 disables it)."""
+
+    name = "rdataframe"
+
+    def _configure_threads(self, ROOT) -> None:
+        if self.threads is None:
+            return
+        ROOT.ROOT.DisableImplicitMT()
+        if self.threads != 1:
+            ROOT.ROOT.EnableImplicitMT(self.threads)
+
+    def sample(self, files: List[Path], cutter: Cutter) -> dict:
+        import ROOT  # type: ignore
+
+        ROOT.gROOT.SetBatch(True)
+        self._configure_threads(ROOT)
+        node = ROOT.RDataFrame(self.tree_name, [str(ifile) for ifile in files])
+        total = node.Count()
+        counts = {}
+        for iname, iexpr in cutter.cuts.items():
+            node = node.Filter(iexpr, iname)
+            counts[iname] = node.Count()
+        # All the booked counts are filled in a single event loop on the first GetValue
+        cutflow = {iname: int(icount.GetValue()) for iname, icount in counts.items()}
+        total = int(total.GetValue())
+        return {"N": total, "NCuted": list(cutflow.values())[-1] if cutflow else total, "cutflow": cutflow}
+
+
+class UprootExecuttor(Executtor):
+    """Backend using uproot and NumPy; `threads` sizes the decompression and interpretation thread pools."""
+
+    name = "uproot"
+
+    def __init__(
+        self,
+        tree_name: str = "DecayTree",
+        threads: Optional[int] = None,
+        step_size: str = "100 MB",
+        keep_open: bool = False,
+        verbose: bool = False,
+    ) -> None:
+        """
+        Initialize the UprootExecuttor class object.
+        ---
+        Parameters:
+            tree_name (str): name of the TTree to read
+            threads (int, optional): number of threads, uproot default if None
+            step_size (str or int): size of the chunks read at once
+            keep_open (bool): keep the files open between calls (reopened if the file changes)
+            verbose (bool): verbose flag
+        Returns:
+            None
+        Raises:
+            None
+        """
+        super().__init__(tree_name=tree_name, threads=threads, verbose=verbose)
+        self.step_size = step_size
+        self.keep_open = keep_open
+        self._files = {}
+
+    def _open(self, file: Path):
+        """Open a file, or reuse the handle kept from a previous call if the file did not change."""
+        import uproot  # type: ignore
+
+        if not self.keep_open:
+            return uproot.open(file)
+        stat = Path(file).stat()
+        key = str(Path(file).resolve())
+        fingerprint = (stat.st_size, stat.st_mtime_ns)
+        if key in self._files and self._files[key][0] != fingerprint:
+            self._files.pop(key)[1].close()
+        if key not in self._files:
+            self._files[key] = (fingerprint, uproot.open(file))
+        return self._files[key][1]
+
+    def close(self) -> None:
+        for _, irootfile in self._files.values():
+            irootfile.close()
+        self._files = {}
+
+    def sample(self, files: List[Path], cutter: Cutter) -> dict:
+        executor = ThreadPoolExecutor(self.threads) if self.threads and self.threads > 1 else None
+        options = {"decompression_executor": executor, "interpretation_executor": executor} if executor else {}
+        total = 0
+        cutflow = {iname: 0 for iname in cutter.cuts.keys()}
+        try:
+            for ifile in files:
+                rootfile = self._open(ifile)
+                try:
+                    tree = rootfile[self.tree_name]
+                    if not cutter.branches:
+                        total += tree.num_entries
+                        continue
+                    for ichunk in tree.iterate(cutter.branches, step_size=self.step_size, library="ak", **options):
+                        total += len(ichunk)
+                        for iname, ncount in cutter.cutflow(cutter.flatten(ichunk), size=len(ichunk)).items():
+                            cutflow[iname] += ncount
+                finally:
+                    if not self.keep_open:
+                        rootfile.close()
+        finally:
+            if executor is not None:
+                executor.shutdown()
+        if not cutter.branches:
+            cutflow = {iname: total for iname in cutflow}
+        return {"N": total, "NCuted": list(cutflow.values())[-1] if cutflow else total, "cutflow": cutflow}
+
+
+class CacheExecuttor(Executtor):
+    """Backend evaluating the cuts on the memory-mapped columns of a `Cacherr` cache (single threaded)."""
+
+    name = "cache"
+
+    def __init__(self, tree_name: str = "DecayTree", threads=None, cache_dir: Path = Path(".cache"), verbose=False):
+        """
+        Initialize the CacheExecuttor class object.
+        ---
+        Parameters:
+            tree_name (str): name of the TTree to read
+            threads (int, optional): ignored, NumPy evaluation runs in one thread
+            cache_dir (Path): directory of the columnar cache
+            verbose (bool): verbose flag
+        Returns:
+            None
+        Raises:
+            None
+        """
+        super().__init__(tree_name=tree_name, threads=threads, verbose=verbose)
+        self.cache = Cacherr(cache_dir, tree_name=tree_name, verbose=verbose)
+
+    def sample(self, files: List[Path], cutter: Cutter) -> dict:
+        total = 0
+        cutflow = {iname: 0 for iname in cutter.cuts.keys()}
+        for ifile in files:
+            columns = self.cache.load(ifile, cutter)
+            size = self.cache.entries(ifile)
+            total += size
+            for iname, ncount in cutter.cutflow(columns, size=size).items():
+                cutflow[iname] += ncount
+        return {"N": total, "NCuted": list(cutflow.values())[-1] if cutflow else total, "cutflow": cutflow}
+
+
+EXECUTTORS = {iclass.name: iclass for iclass in (RDataFrameExecuttor, UprootExecuttor, CacheExecuttor)}
+
+
+def get_executtor(name: str, **kwargs) -> Executtor:
+    """
+    Create a backend by its name.
+    ---
+    Parameters:
+        name (str): one of the `EXECUTTORS` keys ("rdataframe", "uproot", "cache")
+        kwargs: passed to the backend constructor
+    Returns:
+        Executtor: the backend
+    Raises:
+        ValueError: Unknown backend name.
+    """
+    if name not in EXECUTTORS:
+        raise ValueError(f"Unknown backend: {name}. Choose from {list(EXECUTTORS)}.")
+    return EXECUTTORS[name](**kwargs)
+
+
+def _compare(reference, other, path: str, names: Tuple[str, str]) -> List[str]:
+    """Differences between two nested result dictionaries, over the union of their keys (missing ones are None)."""
+    if not isinstance(reference, dict) or not isinstance(other, dict):
+        return [] if reference == other else [f"{path}: {names[0]}={reference}, {names[1]}={other}"]
+    differences = []
+    for ikey in sorted(set(reference) | set(other), key=str):
+        differences += _compare(reference.get(ikey), other.get(ikey), f"{path}[{ikey}]", names)
+    return differences
+
+
+def cross_check(
+    filesFor: dict,
+    decays: dict,
+    kinematic_cuts: dict,
+    backends: Iterable[str] = ("rdataframe", "uproot"),
+    tree_name: str = "DecayTree",
+    options: Optional[dict] = None,
+    printter: Optional[Printter] = None,
+) -> dict:
+    """
+    Run the same analysis on several backends and compare the counts and cutflows.
+    ---
+    Parameters:
+        filesFor (dict): decay tag -> year -> list of files
+        decays (dict): decay tag -> decay name (key of `kinematic_cuts`)
+        kinematic_cuts (dict): decay name -> cuts
+        backends (iterable of str): backend names, the first one is the reference
+        tree_name (str): name of the TTree to read
+        options (dict, optional): backend name -> extra constructor arguments (e.g. {"cache": {"cache_dir": ...}})
+        printter (Printter, optional): Printter instance for console output
+    Returns:
+        dict: "agree" (bool), "differences" (list of str) and "results" (backend name -> results)
+    Raises:
+        ValueError: Unknown backend name.
+    """
+    options = options or {}
+    results = {}
+    for iname in backends:
+        executtor = get_executtor(iname, tree_name=tree_name, **options.get(iname, {}))
+        results[iname] = executtor.run(filesFor, decays, kinematic_cuts)
+    reference, *others = list(results.keys())
+    differences = []
+    for iname in others:
+        for ikey in ("NFor", "NCutedFor", "cutflowFor"):
+            differences += _compare(results[reference][ikey], results[iname][ikey], ikey, (reference, iname))
+
+    if printter:
+        if differences:
+            printter.iprint("Backends disagree:", order=0, colors="red")
+            for idifference in differences:
+                printter.iprint(idifference, order=1, colors="red")
+        else:
+            printter.iprint(f"Backends agree: {', '.join(results.keys())}", order=0, colors="green")
+    return {"agree": not differences, "differences": differences, "results": results}
+
+
+def benchmark(
+    filesFor: dict,
+    decays: dict,
+    kinematic_cuts: dict,
+    backends: Iterable[str] = ("rdataframe", "uproot"),
+    threads: Iterable[int] = (1, 2, 4),
+    repeat: int = 1,
+    warmup: bool = True,
+    tree_name: str = "DecayTree",
+    options: Optional[dict] = None,
+    printter: Optional[Printter] = None,
+) -> List[dict]:
+    """
+    Measure the throughput of every backend for every number of threads. Every backend first does one untimed run,
+    so the timed ones do not pay for the cold page cache or for the one-time conversion of the cache backend.
+    ---
+    Parameters:
+        filesFor (dict): decay tag -> year -> list of files
+        decays (dict): decay tag -> decay name (key of `kinematic_cuts`)
+        kinematic_cuts (dict): decay name -> cuts
+        backends (iterable of str): backend names
+        threads (iterable of int): numbers of threads to try
+        repeat (int): runs per configuration, the fastest one is kept
+        warmup (bool): whether to do the untimed run of every backend
+        tree_name (str): name of the TTree to read
+        options (dict, optional): backend name -> extra constructor arguments (e.g. {"cache": {"cache_dir": ...}})
+        printter (Printter, optional): Printter instance for console output
+    Returns:
+        list: one dict per configuration with "backend", "threads", "seconds", "events" and "throughput" (events/s)
+    Raises:
+        ValueError: Unknown backend name.
+    """
+    options = options or {}
+    threads = list(threads)
+    rows = []
+    for ibackend in backends:
+        if warmup and threads:
+            executtor = get_executtor(ibackend, tree_name=tree_name, threads=threads[0], **options.get(ibackend, {}))
+            executtor.run(filesFor, decays, kinematic_cuts)
+            executtor.close()
+        for jthreads in threads:
+            executtor = get_executtor(ibackend, tree_name=tree_name, threads=jthreads, **options.get(ibackend, {}))
+            seconds = []
+            for _ in range(repeat):
+                start = time.perf_counter()
+                results = executtor.run(filesFor, decays, kinematic_cuts)
+                seconds.append(time.perf_counter() - start)
+            events = sum(sum(idecays.values()) for idecays in results["NFor"].values())
+            best = min(seconds)
+            rows.append(
+                {
+                    "backend": ibackend,
+                    "threads": jthreads,
+                    "seconds": best,
+                    "events": events,
+                    "throughput": events / best if best > 0 else float("inf"),
+                }
+            )
+            if printter:
+                printter.iprint(
+                    f"{ibackend} ({jthreads} threads): {best:.3f} s, {rows[-1]['throughput']:.3e} events/s",
+                    order=1,
+                    colors="cyan",
+                )
+    return rows
@@ -0,0 +1,365 @@
+# Version 0.0.1
+"""
+Resamplerr class for Python scripts applications.
+Single-pass Poisson bootstrap of the efficiencies and of their ratio.
+"""
+import hashlib
+import math
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from .cutter import Cutter, iter_samples
+from .printter import Printter
+
+_GOLDEN = np.uint64(0x9E3779B97F4A7C15)
+_POISSON_CDF = np.cumsum([math.exp(-1) / math.factorial(k) for k in range(20)])
+
+
+def _splitmix64(x: np.ndarray) -> np.ndarray:
+    """SplitMix64 finaliser, a fast bijective mixing of 64-bit integers (wraps around on purpose)."""
+    z = x + _GOLDEN
+    z = (z ^ (z >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+    z = (z ^ (z >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+    return z ^ (z >> np.uint64(31))
+
+
+def poisson_weights(keys: np.ndarray, replicas: int, seed: int = 0) -> np.ndarray:
+    """
+    Poisson(1) bootstrap weights that depend only on the event key, the replica index and the seed, so an event
+    gets the same weights no matter how the data are split into files, chunks or workers.
+    ---
+    Parameters:
+        keys (np.ndarray): 64-bit event keys
+        replicas (int): number of bootstrap replicas
+        seed (int): seed of the bootstrap
+    Returns:
+        np.ndarray: (events, replicas) array of uint8 weights
+    Raises:
+        None
+    """
+    with np.errstate(over="ignore"):
+        base = _splitmix64(np.asarray(keys, dtype=np.uint64) ^ _splitmix64(np.uint64(seed)))
+        counters = np.arange(replicas, dtype=np.uint64) * _GOLDEN
+        bits = _splitmix64(base[:, None] + counters[None, :])
+    uniform = (bits >> np.uint64(11)).astype(np.float64) * 2.0**-53
+    return np.searchsorted(_POISSON_CDF, uniform, side="right").astype(np.uint8)
+
+
+def event_keys(columns: Dict[str, np.ndarray], key_branches: Tuple[str, ...]) -> np.ndarray:
+    """
+    Combine the key branches of the events (e.g. run and event number) into one 64-bit key.
+    ---
+    Parameters:
+        columns (dict): branch name -> 1D array, containing all the key branches
+        key_branches (tuple of str): names of the key branches
+    Returns:
+        np.ndarray: uint64 event keys
+    Raises:
+        KeyError: A key branch is missing.
+    """
+    keys = np.zeros(len(columns[key_branches[0]]), dtype=np.uint64)
+    with np.errstate(over="ignore"):
+        for ibranch in key_branches:
+            keys = _splitmix64(keys ^ np.asarray(columns[ibranch]).astype(np.uint64))
+    return keys
+
+
+class Resamplerr(Printter):
+    """
+    Poisson bootstrap accumulated in the same pass as the counting. For every (year, decay) the weighted number of
+    events before and after the cuts is kept for every replica; the spread over the replicas gives the uncertainty
+    of the efficiencies, of their luminosity-weighted combination and of their ratio.
+    """
+
+    def __init__(
+        self,
+        replicas: int = 200,
+        seed: int = 0,
+        key_branches: Optional[Tuple[str, ...]] = ("runNumber", "eventNumber"),
+        tree_name: str = "DecayTree",
+        step_size: str = "100 MB",
+        batch_size: int = 8192,
+        verbose: bool = False,
+    ) -> None:
+        """
+        Initialize the Resamplerr class object.
+        ---
+        Parameters:
+            replicas (int): number of bootstrap replicas
+            seed (int): seed of the bootstrap
+            key_branches (tuple of str, optional): branches identifying an event, the file path and entry number
+                are used if None
+            tree_name (str): name of the TTree to read
+            step_size (str or int): size of the chunks read at once
+            batch_size (int): number of events whose weights are generated at once (bounds the memory)
+            verbose (bool): verbose flag
+        Returns:
+            None
+        Raises:
+            None
+        """
+        super().__init__(verbose=verbose)  # Inheriting from the Printter class
+        self.replicas = replicas
+        self.seed = seed
+        self.key_branches = tuple(key_branches) if key_branches else None
+        self.tree_name = tree_name
+        self.step_size = step_size
+        self.batch_size = batch_size
+        self.sums = {}
+
+    def _entry(self, year: int, decay: str) -> dict:
+        if (year, decay) not in self.sums:
+            self.sums[(year, decay)] = {
+                "N": 0,
+                "NCuted": 0,
+                "before": np.zeros(self.replicas, dtype=np.int64),
+                "after": np.zeros(self.replicas, dtype=np.int64),
+            }
+        return self.sums[(year, decay)]
+
+    @staticmethod
+    def _salt(year: int, decay: str) -> np.uint64:
+        """Per-sample salt, so equal keys in different samples (e.g. MC run and event numbers) get independent weights."""
+        return np.uint64(int.from_bytes(hashlib.sha1(f"{decay}/{year}".encode()).digest()[:8], "little"))
+
+    def accumulate(self, year: int, decay: str, passed: np.ndarray, keys: np.ndarray) -> None:
+        """
+        Add events to the sums of a sample. The keys are mixed with the sample (decay tag and year) before drawing
+        the weights.
+        ---
+        Parameters:
+            year (int): year of the sample
+            decay (str): decay tag of the sample
+            passed (np.ndarray): boolean mask of the events passing the cuts
+            keys (np.ndarray): uint64 event keys
+        Returns:
+            None
+        Raises:
+            None
+        """
+        entry = self._entry(year, decay)
+        entry["N"] += len(passed)
+        entry["NCuted"] += int(np.count_nonzero(passed))
+        keys = np.asarray(keys, dtype=np.uint64) ^ self._salt(year, decay)
+        for start in range(0, len(passed), self.batch_size):
+            stop = start + self.batch_size
+            weights = poisson_weights(keys[start:stop], self.replicas, self.seed)
+            entry["before"] += weights.sum(axis=0, dtype=np.int64)
+            entry["after"] += weights[passed[start:stop]].sum(axis=0, dtype=np.int64)
+
+    def process(
+        self,
+        files: Iterable[Path],
+        cutter: Cutter,
+        year: int,
+        decay: str,
+        entry_start: Optional[int] = None,
+        entry_stop: Optional[int] = None,
+    ) -> None:
+        """
+        Read a sample (or an entry range of it, e.g. a shard) and accumulate it.
+        ---
+        Parameters:
+            files (iterable of Path): ROOT files of the sample
+            cutter (Cutter): cuts to apply
+            year (int): year of the sample
+            decay (str): decay tag of the sample
+            entry_start (int, optional): first entry to read in every file
+            entry_stop (int, optional): entry after the last one to read in every file
+        Returns:
+            None
+        Raises:
+            None
+        """
+        import uproot  # type: ignore
+
+        branches = sorted(set(cutter.branches) | set(self.key_branches or ()))
+        for ifile in files:
+            salt = int.from_bytes(hashlib.sha1(str(Path(ifile).resolve()).encode()).digest()[:8], "little")
+            with uproot.open(ifile) as rootfile:
+                tree = rootfile[self.tree_name]
+                first = entry_start or 0
+                stop = tree.num_entries if entry_stop is None else min(entry_stop, tree.num_entries)
+                if stop <= first:
+                    continue
+                if not branches:
+                    self._chunk(cutter, None, first, stop, year, decay, salt)
+                    continue
+                chunk_start = first
+                for ichunk in tree.iterate(
+                    branches, entry_start=first, entry_stop=stop, step_size=self.step_size, library="ak"
+                ):
+                    self._chunk(cutter, ichunk, chunk_start, chunk_start + len(ichunk), year, decay, salt)
+                    chunk_start += len(ichunk)
+            self.viprint(f"{decay} ({year}): {ifile}", order=1, colors="cyan")
+
+    def _chunk(self, cutter: Cutter, arrays, start: int, stop: int, year: int, decay: str, salt: int) -> None:
+        columns = cutter.flatten(arrays) if arrays is not None else {}
+        passed = cutter.evaluate(columns, size=stop - start)
+        if self.key_branches:
+            keys = event_keys({ibranch: arrays[ibranch] for ibranch in self.key_branches}, self.key_branches)
+        else:
+            with np.errstate(over="ignore"):
+                keys = _splitmix64(np.arange(start, stop, dtype=np.uint64) ^ np.uint64(salt))
+        self.accumulate(year, decay, passed, keys)
+
+    def run(self, filesFor: dict, decays: dict, kinematic_cuts: dict) -> "Resamplerr":
+        """
+        Accumulate all (decay, year) samples.
+        ---
+        Parameters:
+            filesFor (dict): decay tag -> year -> list of files
+            decays (dict): decay tag -> decay name (key of `kinematic_cuts`)
+            kinematic_cuts (dict): decay name -> cuts
+        Returns:
+            Resamplerr: self, for chaining with `summary`
+        Raises:
+            None
+        """
+        for idecay, jyear, jfiles, jcuts in iter_samples(filesFor, decays, kinematic_cuts):
+            self.process(jfiles, Cutter(jcuts), jyear, idecay)
+        return self
+
+    def merge(self, other: "Resamplerr") -> "Resamplerr":
+        """
+        Add the sums of another Resamplerr (e.g. from another worker) to this one.
+        ---
+        Parameters:
+            other (Resamplerr): bootstrap with the same replicas and seed
+        Returns:
+            Resamplerr: self
+        Raises:
+            ValueError: The replicas or the seed differ.
+        """
+        if (other.replicas, other.seed) != (self.replicas, self.seed):
+            raise ValueError("Only bootstraps with the same replicas and seed can be merged.")
+        for (iyear, idecay), ientry in other.sums.items():
+            entry = self._entry(iyear, idecay)
+            for ikey in ("N", "NCuted", "before", "after"):
+                entry[ikey] = entry[ikey] + ientry[ikey]
+        return self
+
+    def to_dict(self) -> dict:
+        """JSON-serialisable state, e.g. for checkpoints."""
+        sums = []
+        for (iyear, idecay), ientry in self.sums.items():
+            state = {ikey: np.asarray(ivalue).tolist() for ikey, ivalue in ientry.items()}
+            sums.append({"year": iyear, "decay": idecay} | state)
+        return {"replicas": self.replicas, "seed": self.seed, "sums": sums}
+
+    @classmethod
+    def from_dict(cls, state: dict, **kwargs) -> "Resamplerr":
+        """Rebuild a Resamplerr from `to_dict` output."""
+        resamplerr = cls(replicas=state["replicas"], seed=state["seed"], **kwargs)
+        for ientry in state["sums"]:
+            entry = resamplerr._entry(ientry["year"], ientry["decay"])
+            entry["N"], entry["NCuted"] = ientry["N"], ientry["NCuted"]
+            entry["before"] = np.asarray(ientry["before"], dtype=np.int64)
+            entry["after"] = np.asarray(ientry["after"], dtype=np.int64)
+        return resamplerr
+
+    def counts(self, year: int, decay: str) -> Tuple[int, int]:
+        """Unweighted number of events before and after the cuts of one sample (same as `NFor` and `NCutedFor`)."""
+        entry = self.sums[(year, decay)]
+        return entry["N"], entry["NCuted"]
+
+    def efficiency(self, year: int, decay: str) -> Tuple[float, np.ndarray]:
+        """
+        Nominal efficiency and its bootstrap replicas for one sample.
+        ---
+        Parameters:
+            year (int): year of the sample
+            decay (str): decay tag of the sample
+        Returns:
+            tuple: (nominal efficiency, array of replica efficiencies)
+        Raises:
+            KeyError: The sample was not accumulated.
+        """
+        entry = self.sums[(year, decay)]
+        nominal = entry["NCuted"] / entry["N"] if entry["N"] else 0.0
+        with np.errstate(divide="ignore", invalid="ignore"):
+            replicas = np.where(entry["before"] > 0, entry["after"] / entry["before"], 0.0)
+        return nominal, replicas
+
+    def combined(self, decay: str, luminosities: Dict[int, float]) -> Tuple[float, np.ndarray]:
+        """
+        Luminosity-weighted efficiency over the accumulated years (weights normalised to these years).
+        ---
+        Parameters:
+            decay (str): decay tag
+            luminosities (dict): year -> integrated luminosity (e.g. `LUMINOSITIES`)
+        Returns:
+            tuple: (nominal combined efficiency, array of replica combined efficiencies)
+        Raises:
+            KeyError: No accumulated year of the decay has a luminosity.
+        """
+        years = [iyear for (iyear, idecay) in self.sums if idecay == decay and iyear in luminosities]
+        if not years:
+            raise KeyError(f"No luminosity for any year of {decay}")
+        total = sum(luminosities[iyear] for iyear in years)
+        nominal, replicas = 0.0, np.zeros(self.replicas)
+        for iyear in years:
+            inominal, ireplicas = self.efficiency(iyear, decay)
+            nominal += luminosities[iyear] / total * inominal
+            replicas += luminosities[iyear] / total * ireplicas
+        return nominal, replicas
+
+    @staticmethod
+    def _spread(nominal: float, replicas: np.ndarray) -> Tuple[float, float]:
+        return float(nominal), float(np.std(replicas, ddof=1)) if len(replicas) > 1 else 0.0
+
+    def summary(
+        self, luminosities: Optional[Dict[int, float]] = None, numerator="Selected", denominator="Normalization"
+    ) -> dict:
+        """
+        Efficiencies and ratios with their bootstrap uncertainties.
+        ---
+        Parameters:
+            luminosities (dict, optional): year -> integrated luminosity, no combination if None
+            numerator (str): decay tag in the numerator of the ratio
+            denominator (str): decay tag in the denominator of the ratio
+        Returns:
+            dict: "εFor" (year -> decay -> (value, error)), "ratioFor" (year -> (value, error)) and, with
+            luminosities, "εCombined" (decay -> (value, error)) and "ratio" (value, error)
+        Raises:
+            None
+        """
+        results = {"εFor": {}, "ratioFor": {}}
+        for iyear, idecay in self.sums:
+            results["εFor"].setdefault(iyear, {})[idecay] = self._spread(*self.efficiency(iyear, idecay))
+
+        years = sorted({iyear for iyear, _ in self.sums})
+        for iyear in years:
+            if (iyear, numerator) in self.sums and (iyear, denominator) in self.sums:
+                results["ratioFor"][iyear] = self._ratio(
+                    self.efficiency(iyear, numerator), self.efficiency(iyear, denominator)
+                )
+
+        if luminosities is not None:
+            decays: List[str] = sorted({idecay for _, idecay in self.sums})
+            combined = {idecay: self.combined(idecay, luminosities) for idecay in decays}
+            results["εCombined"] = {idecay: self._spread(*icombined) for idecay, icombined in combined.items()}
+            if numerator in combined and denominator in combined:
+                results["ratio"] = self._ratio(combined[numerator], combined[denominator])
+
+        self._print(results, numerator, denominator)
+        return results
+
+    def _ratio(self, numerator: Tuple[float, np.ndarray], denominator: Tuple[float, np.ndarray]):
+        with np.errstate(divide="ignore", invalid="ignore"):
+            nominal = numerator[0] / denominator[0] if denominator[0] else float("nan")
+            replicas = numerator[1] / denominator[1]
+        return self._spread(nominal, replicas[np.isfinite(replicas)])
+
+    def _print(self, results: dict, numerator: str, denominator: str) -> None:
+        self.viprint(f"Bootstrap with {self.replicas} replicas (seed {self.seed})", order=0, colors="green")
+        for iyear, idecays in results["εFor"].items():
+            for jdecay, (jvalue, jerror) in idecays.items():
+                self.viprint(f"ε {jdecay} ({iyear}) = {jvalue:.5f} ± {jerror:.5f}", order=1, colors="cyan")
+        for idecay, (ivalue, ierror) in results.get("εCombined", {}).items():
+            self.viprint(f"ε {idecay} (combined) = {ivalue:.5f} ± {ierror:.5f}", order=1, colors="cyan")
+        if "ratio" in results:
+            value, error = results["ratio"]
+            self.viprint(f"ε {numerator} / ε {denominator} = {value:.5f} ± {error:.5f}", order=1, colors="green")
@@ -0,0 +1,254 @@
+# Version 0.0.1
+"""
+Samplerr class for Python scripts applications.
+Quick-look efficiencies from randomly chosen clusters, stopped once the requested precision is reached.
+"""
+from pathlib import Path
+from statistics import NormalDist
+from typing import Dict, List, Tuple
+
+import numpy as np
+
+from .cutter import Cutter, iter_samples
+from .printter import Printter
+
+
+def wilson_interval(passed: int, total: int, confidence: float = 0.6827) -> Tuple[float, float]:
+    """
+    Wilson score interval of a binomial efficiency.
+    ---
+    Parameters:
+        passed (int): number of events passing the cuts
+        total (int): number of events
+        confidence (float): confidence level of the interval (default 1 sigma)
+    Returns:
+        tuple: (lower, upper) bound of the efficiency
+    Raises:
+        None
+    """
+    if total == 0:
+        return 0.0, 1.0
+    z = NormalDist().inv_cdf(0.5 + confidence / 2)
+    ratio = passed / total
+    denominator = 1 + z**2 / total
+    centre = (ratio + z**2 / (2 * total)) / denominator
+    halfwidth = z * (ratio * (1 - ratio) / total + z**2 / (4 * total**2)) ** 0.5 / denominator
+    return max(0.0, centre - halfwidth), min(1.0, centre + halfwidth)
+
+
+def clopper_pearson_interval(passed: int, total: int, confidence: float = 0.6827) -> Tuple[float, float]:
+    """
+    Clopper-Pearson (exact) interval of a binomial efficiency. Needs scipy.
+    ---
+    Parameters:
+        passed (int): number of events passing the cuts
+        total (int): number of events
+        confidence (float): confidence level of the interval (default 1 sigma)
+    Returns:
+        tuple: (lower, upper) bound of the efficiency
+    Raises:
+        ImportError: scipy is not installed.
+    """
+    from scipy.stats import beta  # type: ignore
+
+    if total == 0:
+        return 0.0, 1.0
+    alpha = 1 - confidence
+    lower = beta.ppf(alpha / 2, passed, total - passed + 1) if passed > 0 else 0.0
+    upper = beta.ppf(1 - alpha / 2, passed + 1, total - passed) if passed < total else 1.0
+    return float(lower), float(upper)
+
+
+INTERVALS = {"wilson": wilson_interval, "clopper-pearson": clopper_pearson_interval}
+
+
+class Samplerr(Printter):
+    """
+    Approximate analysis loop. For every (year, decay) the entry ranges of the input files are split at the cluster
+    boundaries of the cut branches, shuffled, and read one by one until the efficiency interval is narrow enough.
+    Events of one cluster are correlated (ntuples are written job by job), so besides the binomial interval the
+    half-width is also estimated from the spread of the per-cluster efficiencies (ratio estimator) and the larger of
+    the two is used. The interval is checked after every cluster without correcting for these repeated looks, so its
+    coverage is only approximately the requested confidence level.
+    """
+
+    def __init__(
+        self,
+        tree_name: str = "DecayTree",
+        precision: float = 0.001,
+        relative: bool = False,
+        method: str = "wilson",
+        confidence: float = 0.6827,
+        seed: int = 0,
+        step: int = 100_000,
+        min_passed: int = 10,
+        min_entries: int = 10_000,
+        min_clusters: int = 5,
+        verbose: bool = False,
+    ) -> None:
+        """
+        Initialize the Samplerr class object.
+        ---
+        Parameters:
+            tree_name (str): name of the TTree to read
+            precision (float): target half-width of the efficiency interval
+            relative (bool): whether the precision is relative to the efficiency instead of absolute
+            method (str): interval type, "wilson" or "clopper-pearson"
+            confidence (float): confidence level of the interval (default 1 sigma)
+            seed (int): seed of the cluster shuffling
+            step (int): size of the entry ranges used when the cluster boundaries are not available
+            min_passed (int): minimal number of passing events before the sampling may stop
+            min_entries (int): minimal number of read entries before the sampling may stop
+            min_clusters (int): minimal number of read clusters before the sampling may stop
+            verbose (bool): verbose flag
+        Returns:
+            None
+        Raises:
+            ValueError: Unknown interval method.
+        """
+        super().__init__(verbose=verbose)  # Inheriting from the Printter class
+        if method not in INTERVALS:
+            raise ValueError(f"Unknown interval method: {method}. Choose from {list(INTERVALS)}.")
+        self.tree_name = tree_name
+        self.precision = precision
+        self.relative = relative
+        self.method = method
+        self.confidence = confidence
+        self.seed = seed
+        self.step = step
+        self.min_passed = min_passed
+        self.min_entries = min_entries
+        self.min_clusters = min_clusters
+
+    def interval(self, passed: int, total: int) -> Tuple[float, float]:
+        """Efficiency interval with the configured method and confidence level."""
+        return INTERVALS[self.method](passed, total, self.confidence)
+
+    def cluster_halfwidth(self, passedFor: List[int], totalFor: List[int]) -> float:
+        """
+        Half-width of the efficiency interval from the spread of the per-cluster efficiencies (ratio estimator).
+        ---
+        Parameters:
+            passedFor (list of int): number of passing events in every read cluster
+            totalFor (list of int): number of events in every read cluster
+        Returns:
+            float: half-width, infinite with less than `min_clusters` (or two) clusters
+        Raises:
+            None
+        """
+        clusters = len(totalFor)
+        if clusters < max(self.min_clusters, 2):
+            return float("inf")
+        passed, total = np.asarray(passedFor, dtype=np.float64), np.asarray(totalFor, dtype=np.float64)
+        ratio = passed.sum() / total.sum()
+        variance = clusters / (clusters - 1) * np.sum((passed - ratio * total) ** 2) / total.sum() ** 2
+        return NormalDist().inv_cdf(0.5 + self.confidence / 2) * float(variance) ** 0.5
+
+    def converged(self, passed: int, total: int, cluster_halfwidth: float = 0.0) -> bool:
+        """
+        Check if the efficiency interval reached the target precision. Nothing converges before `min_passed` events
+        passed and `min_entries` entries were read, so that a small efficiency is not stopped at ε = 0. The larger of
+        the binomial and the `cluster_halfwidth` half-widths is compared with the target.
+        """
+        if passed < self.min_passed or total < max(self.min_entries, 1):
+            return False
+        lower, upper = self.interval(passed, total)
+        halfwidth = max((upper - lower) / 2, cluster_halfwidth)
+        target = self.precision * passed / total if self.relative else self.precision
+        return halfwidth <= target
+
+    def _ranges(self, trees: Dict[Path, object], branches: List[str]) -> List[Tuple[Path, int, int]]:
+        """List the cluster entry ranges of all the files, in a random (but reproducible) order."""
+        ranges = []
+        for ifile, itree in trees.items():
+            if branches and hasattr(itree, "common_entry_offsets"):
+                offsets = itree.common_entry_offsets(filter_name=branches)
+            else:
+                offsets = list(range(0, itree.num_entries, self.step)) + [itree.num_entries]
+            ranges += [(ifile, int(start), int(stop)) for start, stop in zip(offsets[:-1], offsets[1:]) if stop > start]
+        order = np.random.default_rng(self.seed).permutation(len(ranges))
+        return [ranges[i] for i in order]
+
+    def sample(self, files: List[Path], cuts) -> dict:
+        """
+        Estimate the efficiency of the cuts on one sample, reading clusters until the precision is reached.
+        ---
+        Parameters:
+            files (list of Path): ROOT files of the sample (e.g. `filesFor[decay][year]`)
+            cuts (dict or Cutter): cuts to apply
+        Returns:
+            dict: "N", "NCuted", "ε", "interval" (binomial, widened to the cluster spread if that is larger),
+            "entries" (total entries) and "fraction" (fraction read)
+        Raises:
+            None
+        """
+        import uproot  # type: ignore
+
+        cutter = cuts if isinstance(cuts, Cutter) else Cutter(cuts)
+        rootfiles = {Path(ifile): uproot.open(ifile) for ifile in files}
+        try:
+            trees = {ifile: irootfile[self.tree_name] for ifile, irootfile in rootfiles.items()}
+            entries = sum(itree.num_entries for itree in trees.values())
+            passedFor, totalFor = [], []
+            halfwidth = float("inf")
+            for ifile, start, stop in self._ranges(trees, cutter.branches):
+                columns = cutter.arrays(trees[ifile], entry_start=start, entry_stop=stop)
+                totalFor.append(stop - start)
+                passedFor.append(int(np.count_nonzero(cutter.evaluate(columns, size=stop - start))))
+                halfwidth = self.cluster_halfwidth(passedFor, totalFor)
+                if self.converged(sum(passedFor), sum(totalFor), halfwidth):
+                    break
+        finally:
+            for irootfile in rootfiles.values():
+                irootfile.close()
+
+        total, passed = sum(totalFor), sum(passedFor)
+        ratio = passed / total if total > 0 else 0.0
+        lower, upper = self.interval(passed, total)
+        if total < entries:  # The whole sample read is exact up to the binomial interval
+            lower, upper = max(0.0, min(lower, ratio - halfwidth)), min(1.0, max(upper, ratio + halfwidth))
+        return {
+            "N": total,
+            "NCuted": passed,
+            "ε": ratio,
+            "interval": (lower, upper),
+            "entries": entries,
+            "fraction": total / entries if entries > 0 else 0.0,
+        }
+
+    def run(self, filesFor: dict, decays: dict, kinematic_cuts: dict) -> dict:
+        """
+        Quick-look analysis loop over all (decay, year) samples.
+        ---
+        Parameters:
+            filesFor (dict): decay tag -> year -> list of files
+            decays (dict): decay tag -> decay name (key of `kinematic_cuts`)
+            kinematic_cuts (dict): decay name -> cuts
+        Returns:
+            dict: "NFor", "NCutedFor", "εFor", "intervalFor", "fractionFor" keyed by year and decay tag, and the
+            overall "fraction" of entries read
+        Raises:
+            None
+        """
+        results = {"NFor": {}, "NCutedFor": {}, "εFor": {}, "intervalFor": {}, "fractionFor": {}}
+        read, entries = 0, 0
+        for idecay, jyear, jfiles, jcuts in iter_samples(filesFor, decays, kinematic_cuts):
+            sample = self.sample(jfiles, jcuts)
+            for ikey, jkey in (("NFor", "N"), ("NCutedFor", "NCuted"), ("εFor", "ε")):
+                results[ikey].setdefault(jyear, {})[idecay] = sample[jkey]
+            results["intervalFor"].setdefault(jyear, {})[idecay] = sample["interval"]
+            results["fractionFor"].setdefault(jyear, {})[idecay] = sample["fraction"]
+            read += sample["N"]
+            entries += sample["entries"]
+
+            lower, upper = sample["interval"]
+            self.viprint(f"{idecay} ({jyear})", order=1, colors="cyan")
+            self.viprint(f"ε = {sample['ε']:.5f} [{lower:.5f}, {upper:.5f}]", order=2, colors="cyan")
+            self.viprint(
+                f"Read {sample['N']} of {sample['entries']} entries ({100 * sample['fraction']:.2f}%)",
+                order=2,
+                colors="cyan",
+            )
+        results["fraction"] = read / entries if entries > 0 else 0.0
+        self.viprint(f"Read {100 * results['fraction']:.2f}% of all entries", order=0, colors="green")
+        return results
@@ -0,0 +1,227 @@
+# Version 0.0.1
+"""
+Shardder class for Python scripts applications.
+Splits the samples into entry-range shards, runs them on local worker processes and checkpoints every shard.
+"""
+import hashlib
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+from typing import List, Optional
+
+from .cutter import Cutter, iter_samples
+from .printter import Printter
+
+
+def _run_shard(shard: dict, tree_name: str, checkpoint: Path) -> dict:
+    """
+    Count one shard and write its checkpoint atomically. Module level so it can be sent to worker processes.
+    ---
+    Parameters:
+        shard (dict): shard description from `Shardder.plan`
+        tree_name (str): name of the TTree to read
+        checkpoint (Path): where to write the partial counts
+    Returns:
+        dict: the checkpoint content
+    Raises:
+        None
+    """
+    import uproot  # type: ignore
+
+    cutter = Cutter(shard["cuts"])
+    size = shard["stop"] - shard["start"]
+    with uproot.open(shard["file"]) as rootfile:
+        columns = cutter.arrays(rootfile[tree_name], entry_start=shard["start"], entry_stop=shard["stop"])
+    cutflow = cutter.cutflow(columns, size=size)
+    result = {
+        "id": shard["id"],
+        "decay": shard["decay"],
+        "year": shard["year"],
+        "N": size,
+        "NCuted": list(cutflow.values())[-1] if cutflow else size,
+        "cutflow": cutflow,
+    }
+
+    checkpoint = Path(checkpoint)
+    temporary = checkpoint.with_name(f".{checkpoint.name}.{os.getpid()}.tmp")
+    with open(temporary, "w") as f:
+        json.dump(result, f)
+        f.flush()
+        os.fsync(f.fileno())  # A crash must not leave a truncated checkpoint behind the rename
+    os.replace(temporary, checkpoint)
+    return result
+
+
+class Shardder(Printter):
+    """
+    Resumable analysis loop. Every (decay, year) sample is split into entry ranges of at most `shard_size`
+    entries per file; the counts of every finished shard are stored in `checkpoint_dir`, so a rerun only
+    processes the shards that are missing.
+    """
+
+    def __init__(
+        self,
+        checkpoint_dir: Path,
+        tree_name: str = "DecayTree",
+        shard_size: int = 1_000_000,
+        workers: Optional[int] = None,
+        verbose: bool = False,
+    ) -> None:
+        """
+        Initialize the Shardder class object.
+        ---
+        Parameters:
+            checkpoint_dir (Path): directory for the shard checkpoints
+            tree_name (str): name of the TTree to read
+            shard_size (int): maximal number of entries in a shard
+            workers (int, optional): number of worker processes, number of CPUs if None
+            verbose (bool): verbose flag
+        Returns:
+            None
+        Raises:
+            None
+        """
+        super().__init__(verbose=verbose)  # Inheriting from the Printter class
+        self.checkpoint_dir = Path(checkpoint_dir)
+        self.tree_name = tree_name
+        self.shard_size = shard_size
+        self.workers = workers
+
+    def _checkpoint(self, shard: dict) -> Path:
+        return self.checkpoint_dir / f"{shard['id']}.json"
+
+    def plan(self, filesFor: dict, decays: dict, kinematic_cuts: dict) -> List[dict]:
+        """
+        Split all the samples into shards. The shard id depends on the file (path, size and modification time),
+        the entry range, the tree and the cuts, so changing any of them invalidates the old checkpoints.
+        ---
+        Parameters:
+            filesFor (dict): decay tag -> year -> list of files
+            decays (dict): decay tag -> decay name (key of `kinematic_cuts`)
+            kinematic_cuts (dict): decay name -> cuts
+        Returns:
+            list: shard descriptions ("id", "decay", "year", "file", "start", "stop", "cuts")
+        Raises:
+            None
+        """
+        import uproot  # type: ignore
+
+        shards = []
+        for idecay, jyear, jfiles, jcuts in iter_samples(filesFor, decays, kinematic_cuts):
+            for kfile in jfiles:
+                kfile = Path(kfile).resolve()
+                stat = kfile.stat()
+                with uproot.open(kfile) as rootfile:
+                    entries = rootfile[self.tree_name].num_entries
+                # An empty file still gets one empty shard, so the sample is reported with N = 0
+                for start in range(0, max(entries, 1), self.shard_size):
+                    stop = min(start + self.shard_size, entries)
+                    key = json.dumps([str(kfile), stat.st_size, stat.st_mtime_ns, self.tree_name, start, stop, jcuts])
+                    shards.append(
+                        {
+                            "id": hashlib.sha1(key.encode()).hexdigest()[:20],
+                            "decay": idecay,
+                            "year": jyear,
+                            "file": str(kfile),
+                            "start": start,
+                            "stop": stop,
+                            "cuts": jcuts,
+                        }
+                    )
+        return shards
+
+    def _done(self, shard: dict) -> bool:
+        """Whether the shard has a readable checkpoint."""
+        try:
+            with open(self._checkpoint(shard), "r") as f:
+                return json.load(f)["id"] == shard["id"]
+        except (OSError, ValueError, KeyError, TypeError):
+            return False
+
+    def pending(self, shards: List[dict]) -> List[dict]:
+        """Shards without a readable checkpoint (missing, truncated or corrupted ones are run again)."""
+        return [ishard for ishard in shards if not self._done(ishard)]
+
+    def run(self, filesFor: dict, decays: dict, kinematic_cuts: dict) -> dict:
+        """
+        Run the missing shards on a pool of worker processes and merge all the checkpoints.
+        ---
+        Parameters:
+            filesFor (dict): decay tag -> year -> list of files
+            decays (dict): decay tag -> decay name (key of `kinematic_cuts`)
+            kinematic_cuts (dict): decay name -> cuts
+        Returns:
+            dict: "NFor", "NCutedFor", "εFor" and "cutflowFor" keyed by year and decay tag
+        Raises:
+            RuntimeError: Some shards failed; the finished ones are kept for the next run.
+        """
+        self.checkpoint_dir.mkdir(parents=True, exist_ok=True)
+        shards = self.plan(filesFor, decays, kinematic_cuts)
+        pending = self.pending(shards)
+        self.viprint(
+            f"Shards: {len(shards)} planned, {len(shards) - len(pending)} done, {len(pending)} to run",
+            order=0,
+            colors="green",
+        )
+
+        failed = []
+        if pending:
+            with ProcessPoolExecutor(max_workers=self.workers) as executor:
+                futures = {
+                    executor.submit(_run_shard, ishard, self.tree_name, self._checkpoint(ishard)): ishard
+                    for ishard in pending
+                }
+                try:
+                    for done, ifuture in enumerate(as_completed(futures), start=1):
+                        ishard = futures[ifuture]
+                        label = f"{ishard['decay']} ({ishard['year']}) {Path(ishard['file']).name}"
+                        label += f" [{ishard['start']}, {ishard['stop']})"
+                        try:
+                            ifuture.result()
+                            self.viprint(f"{done}/{len(pending)} {label}", order=1, colors="cyan")
+                        except Exception as e:
+                            failed.append(ishard)
+                            self.iprint(f"Shard failed: {label}: {e}", order=1, colors="red")
+                except BaseException:
+                    # On Ctrl-C drop the queued shards; the running ones still write their checkpoints
+                    executor.shutdown(wait=False, cancel_futures=True)
+                    raise
+        if failed:
+            raise RuntimeError(f"{len(failed)} of {len(pending)} shards failed. Rerun to retry them.")
+
+        return self.merge(shards)
+
+    def merge(self, shards: List[dict]) -> dict:
+        """
+        Merge the checkpoints of the given shards into the analysis dictionaries.
+        ---
+        Parameters:
+            shards (list): shard descriptions from `plan`
+        Returns:
+            dict: "NFor", "NCutedFor", "εFor" and "cutflowFor" keyed by year and decay tag
+        Raises:
+            FileNotFoundError: A shard has no checkpoint yet.
+        """
+        results = {"NFor": {}, "NCutedFor": {}, "εFor": {}, "cutflowFor": {}}
+        for ishard in shards:
+            with open(self._checkpoint(ishard), "r") as f:
+                counts = json.load(f)
+            year, decay = ishard["year"], ishard["decay"]
+            for ikey, jkey in (("NFor", "N"), ("NCutedFor", "NCuted")):
+                results[ikey].setdefault(year, {})
+                results[ikey][year][decay] = results[ikey][year].get(decay, 0) + counts[jkey]
+            cutflow = results["cutflowFor"].setdefault(year, {}).setdefault(decay, {})
+            for icut, ncount in counts["cutflow"].items():
+                cutflow[icut] = cutflow.get(icut, 0) + ncount
+
+        for iyear, idecays in results["NFor"].items():
+            results["εFor"][iyear] = {}
+            for jdecay, nfor in idecays.items():
+                results["εFor"][iyear][jdecay] = results["NCutedFor"][iyear][jdecay] / nfor if nfor > 0 else 0.0
+        return results
+
+    def clear(self) -> None:
+        """Remove all the checkpoints, and the temporary files left by killed workers."""
+        for icheckpoint in [*self.checkpoint_dir.glob("*.json"), *self.checkpoint_dir.glob(".*.tmp")]:
+            icheckpoint.unlink()